@@ -1,14 +1,25 @@
+import io
 import os.path
+
 import ruamel.yaml
 
 from .log import Logging, log_dict
 
 
-YAML = ruamel.yaml.YAML()
-YAML.indent(sequence=4, mapping=4, offset=2)
+#: Fast, C-backed loader and dumper, working with plain Python structures.
+YAML_FAST = ruamel.yaml.YAML(typ='safe')
+YAML_FAST.default_flow_style = False
+YAML_FAST.indent(sequence=4, mapping=4, offset=2)
 
 UNITS = {}
 
+#: Maps unit symbol to a sequence of ``(C, unit)`` steps an amount in this unit is raised through.
+#: Built by :py:func:`load_units`.
+RAISE_CHAINS = {}
+
+# Maps unit symbol to a function raising an amount in this unit, see :py:func:`_compile_raiser`.
+_RAISERS = {}
+
 
 def normalize_path(path, fine_if_missing=False, logger=None):
     if not path:
@@ -18,7 +29,10 @@ def normalize_path(path, fine_if_missing=False, logger=None):
 
     real_path = os.path.expanduser(path)
 
-    if not os.path.exists(real_path) and fine_if_missing is not True:
+    if fine_if_missing is True:
+        return real_path
+
+    if not os.path.exists(real_path):
         raise Exception("Path '{}' does not exist".format(path))
 
     return real_path
@@ -27,17 +41,21 @@ def normalize_path(path, fine_if_missing=False, logger=None):
 def load_yaml(path, logger=None):
     logger = logger or Logging.get_logger()
 
-    real_path = normalize_path(path, logger=logger)
+    # no need to check whether the file exists, open() will tell us
+    real_path = normalize_path(path, logger=logger, fine_if_missing=True)
 
     logger.debug("loading YAML from '{}' (maps to '{}')".format(path, real_path))
 
     try:
-        with open(real_path, 'r') as f:
-            data = YAML.load(f)
+        with io.open(real_path, mode='r', encoding='utf-8') as f:
+            data = YAML_FAST.load(f)
             log_dict(logger.debug, "loaded YAML data from '{}'".format(path), data)
 
             return data
 
+    except IOError as exc:
+        raise Exception("Unable to open YAML file '{}': {}".format(path, exc))
+
     except ruamel.yaml.YAMLError as exc:
         raise Exception("Unable to load YAML file '{}': {}".format(path, exc))
 
@@ -48,19 +66,20 @@ def dump_yaml(data, path, logger=None):
     real_path = normalize_path(path, logger=logger, fine_if_missing=True)
 
     try:
-        with open(real_path, 'w') as f:
-            YAML.dump(data, f)
-            f.flush()
+        with io.open(real_path, mode='w', encoding='utf-8') as f:
+            YAML_FAST.dump(data, f)
 
     except ruamel.yaml.YAMLError as exc:
         raise Exception("Unable to save YAML file '{}': {}".format(path, exc))
 
 
 class Unit(object):
+    __slots__ = ('symbol', 'aliases', 'raising', 'lowering')
+
     def __init__(self, symbol):
         self.symbol = symbol
 
-        self.aliases = [symbol]
+        self.aliases = (symbol,)
 
         self.raising = None
         self.lowering = None
@@ -89,6 +108,8 @@ class Unit(object):
 
 
 class Amount(object):
+    __slots__ = ('amount', 'unit')
+
     def __init__(self, amount, unit):
         self.amount = amount
         self.unit = unit
@@ -111,22 +132,80 @@ class Amount(object):
         return '<{} {}>'.format(self.amount, self.unit.symbol)
 
 
+def raise_amount(value, unit):
+    """
+    Raise the amount to the highest unit possible.
+
+    :param float value: the amount.
+    :param Unit unit: unit of the amount.
+    :rtype: Amount
+    """
+
+    return _RAISERS[unit.symbol](value)
+
+
+def _compile_raiser(unit, chain):
+    """
+    Create a function raising an amount in the given unit, specialized for its chain: all steps
+    are unrolled, with their constants written directly into the code. The arithmetic is the same
+    as walking the chain step by step, results do not differ.
+
+    :param Unit unit: unit the function accepts.
+    :param tuple chain: ``(C, unit)`` steps, as stored in :py:data:`RAISE_CHAINS`.
+    :rtype: callable
+    :returns: function accepting a ``float`` and returning :py:class:`Amount`.
+    """
+
+    lines = ['def raiser(value):']
+
+    lines += ['    value *= {!r}'.format(k) for k, _ in chain]
+    lines += ['    return Amount(value, upper_unit)']
+
+    namespace = {
+        'Amount': Amount,
+        'upper_unit': chain[-1][1] if chain else unit
+    }
+
+    exec('\n'.join(lines), namespace)  # pylint: disable=exec-used
+
+    return namespace['raiser']
+
+
 def load_units():
     unit_defs = load_yaml('units.yml')
 
-    for symbol, properties in unit_defs.iteritems():
+    units = []
+
+    for symbol, properties in unit_defs.items():
         unit = Unit(symbol)
 
-        unit.aliases += properties.get('aliases', [])
+        unit.aliases += tuple(properties.get('aliases', ()))
         unit.raising = properties.get('raise', None)
         unit.lowering = properties.get('lower', None)
 
         for alias in unit.aliases:
             UNITS[alias] = unit
 
-    for symbol, unit in UNITS.iteritems():
+        units.append(unit)
+
+    # Now all units are known, replace symbols with actual units. Walk the list of units,
+    # not UNITS, to resolve each unit just once, no matter how many aliases it has.
+    get_unit = UNITS.__getitem__
+
+    for unit in units:
         if unit.raising is not None:
-            unit.raising = (UNITS[unit.raising['unit']], unit.raising['C'])
+            unit.raising = (get_unit(unit.raising['unit']), unit.raising['C'])
 
         if unit.lowering is not None:
-            unit.lowering = (UNITS[unit.lowering['unit']], unit.lowering['C'])
+            unit.lowering = (get_unit(unit.lowering['unit']), unit.lowering['C'])
+
+    for unit in units:
+        chain = []
+
+        upper_unit = unit
+        while upper_unit.can_be_raised:
+            upper_unit, k = upper_unit.raising
+            chain.append((k, upper_unit))
+
+        RAISE_CHAINS[unit.symbol] = tuple(chain)
+        _RAISERS[unit.symbol] = _compile_raiser(unit, RAISE_CHAINS[unit.symbol])
@@ -1,21 +1,92 @@
+import io
 import os.path
 import sys
 import tempfile
 import uuid
 
+try:
+    from shutil import get_terminal_size
+
+except ImportError:
+    # Python 2 - click releases supporting it still provide their own implementation
+    from click import get_terminal_size
+
 import click
 
-from .. import normalize_path, load_yaml, load_units
+from .. import normalize_path, load_units, YAML_FAST
 from ..db import DB
 from ..log import Logging, ContextAdapter
 
 
+#: Environment shared by all templates rendered by commands. Created on the first use, to
+#: spare commands that don't render anything the cost of importing Jinja.
+JINJA_ENV = None
+
+# Compiled templates, keyed by their source.
+_TEMPLATES = {}
+
+# Width of the terminal, queried just once.
+_TERM_COLUMNS = None
+
+
+def render_template(source, **variables):
+    """
+    Render a template. Each template is compiled just once, on its first use.
+
+    :param str source: template text.
+    :param variables: variables available to the template.
+    :rtype: str
+    """
+
+    global JINJA_ENV  # pylint: disable=global-statement
+
+    template = _TEMPLATES.get(source)
+
+    if template is None:
+        if JINJA_ENV is None:
+            import jinja2
+
+            JINJA_ENV = jinja2.Environment(autoescape=False, auto_reload=False)
+
+        template = _TEMPLATES[source] = JINJA_ENV.from_string(source)
+
+    return template.render(**variables)
+
+
+def render_markdown(text):
+    """
+    Format Markdown text for the terminal.
+
+    :param str text: Markdown text.
+    :rtype: str
+    """
+
+    global _TERM_COLUMNS  # pylint: disable=global-statement
+
+    # mdv is quite heavy to import, pulling in Pygments and its themes - import it only when needed.
+    import mdv
+
+    # When not printing to a terminal, there's no width to query, stick with mdv's default.
+    if _TERM_COLUMNS is None and sys.stdout.isatty():
+        _TERM_COLUMNS = get_terminal_size()[0]
+
+    if _TERM_COLUMNS is not None:
+        mdv.term_columns = _TERM_COLUMNS
+
+    return mdv.main(text, theme='785.6556')
+
+
 class GlobalContext(object):
     logger = None
     database_path = None
     db = None
 
     def open_database(self):
+        # Commands and helpers they call must share the very same database - documents, caches
+        # and open transactions belong to one DB instance.
+        if self.db is not None:
+            return self.db
+
         if not os.path.exists(self.database_path):
             self.logger.error('Database path {} does not exist. If the path is correct, please run `feed-em init` first.'.format(self.database_path))
             sys.exit(1)
@@ -39,68 +110,83 @@ def cli(ctx, database_path):
 
 
 def edit_yaml(text, validator):
+    """
+    Let user edit a YAML document, until it's valid or user gives up.
+
+    :param str text: initial text of the document.
+    :param callable validator: called with the parsed document, returns ``True`` when it's valid.
+    :returns: ``(text, data)`` pair, the edited text and its parsed form, or ``(None, None)``
+        when user dropped the changes.
+    """
+
     logger = Logging.get_logger()
 
-    f = tempfile.NamedTemporaryFile(suffix='.yml', delete=False)
-    f.close()
+    fd, path = tempfile.mkstemp(suffix='.yml')
 
-    with click.open_file(f.name, mode='w', encoding='utf-8') as f:
+    with io.open(fd, mode='w', encoding='utf-8') as f:
         f.write(text)
-        f.flush()
 
-    while True:
-        click.edit(filename=f.name)
+    try:
+        while True:
+            click.edit(filename=path)
+
+            with io.open(path, mode='r', encoding='utf-8') as f:
+                text = f.read()
 
-        try:
-            data = load_yaml(f.name)
+            try:
+                data = YAML_FAST.load(text)
 
-        except Exception:
-            validation_result = 'it is broken'
+            except Exception:
+                validation_result = 'it is broken'
 
-        else:
-            validation_result = validator(data)
+            else:
+                validation_result = validator(data)
+
+                if validation_result is not True:
+                    validation_result = 'item {} has invalid value: {}'.format('.'.join(validation_result.path), validation_result.message)
 
             if validation_result is not True:
-                validation_result = 'item {} has invalid value: {}'.format('.'.join(validation_result.path), validation_result.message)
+                logger.error('Recipe is not valid, {}'.format(validation_result))
 
-        if validation_result is not True:
-            logger.error('Recipe is not valid, {}'.format(validation_result))
+                click.clear()
 
-            click.clear()
+                if click.confirm('Found errors. Y to re-edit, N to drop changes') is not True:
+                    return None, None
 
-            if click.confirm('Found errors. Y to re-edit, N to drop changes') is not True:
-                return None
+                continue
 
-            continue
+            click.clear()
 
-        click.clear()
+            if not click.confirm('Save changes?'):
+                return None, None
 
-        if not click.confirm('Save changes?'):
-            return None
+            return text, data
 
-        with click.open_file(f.name, mode='r', encoding='utf-8') as f:
-            return f.read()
+    finally:
+        os.unlink(path)
 
 
 def cmd_edit_document(ctx, document, validator):
     logger = ctx.obj.logger
-    ctx.obj.open_database()
+    db = ctx.obj.open_database()
 
-    document_text = edit_yaml(document.raw, validator)
+    document_text, document_data = edit_yaml(document.raw, validator)
 
     if document_text is None:
         logger.info('Ack, no changes made')
         return
 
-    document.raw = document_text
+    with db.transaction():
+        document.update(document_text, document_data)
+
     logger.info('Ack, {} updated'.format(document.document_id))
 
 
-def cmd_new_document(ctx, document_type, template, document_class):
+def cmd_new_document(ctx, template, document_class):
     logger = ctx.obj.logger
     db = ctx.obj.open_database()
 
-    document_text = edit_yaml(template, document_class.validate)
+    document_text, document_data = edit_yaml(template, document_class.validate)
 
     if document_text is None:
         logger.info('Ack, no document created')
@@ -109,9 +195,6 @@ def cmd_new_document(ctx, document_type, template, document_class):
     document_id = uuid.uuid4().hex
     logger.info('New ID is {}'.format(document_id))
 
-    document = document_class.new(db, document_id)
-    document.raw = document_text
-
-    index = db.index
-    index[document_type].append(document_id)
-    index.save(force=True)
+    with db.transaction():
+        document = document_class.new(db, document_id)
+        document.update(document_text, document_data)
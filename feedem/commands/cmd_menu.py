@@ -1,11 +1,9 @@
 import collections
 
 import click
-import jinja2
-import mdv
 
 from ..db import Menu, Recipe
-from . import cli
+from . import cli, render_markdown, render_template
 
 
 MENU_TEMPLATE = u"""
@@ -36,8 +34,7 @@ MENU_TEMPLATE = u"""
 
  * **{{ meal['name'] }}**:
   {% for recipe in meal['recipes'] %}
-    {% set real_recipe = Recipe.find(DB, name=recipe, did=recipe) %}
-    {% if not real_recipe %}
+    {% if not RECIPES[recipe] %}
     * {{ recipe }} [Cannot find the recipe]
     {% else %}
     * {{ recipe }}
@@ -54,7 +51,7 @@ SHOPPING_LIST_TEMPLATE = u"""
 
 ---
 
-{% for name, amounts in SHOPPING_LIST.iteritems() %}
+{% for name, amounts in SHOPPING_LIST.items() %}
 #### {{ name }}
 
   {% for amount in amounts %}
@@ -65,7 +62,29 @@ SHOPPING_LIST_TEMPLATE = u"""
 {% endfor %}
 """
 
-mdv.term_columns = click.get_terminal_size()[0]
+
+def menu_recipes(db, menu):
+    """
+    Find all recipes referenced by a menu.
+
+    :returns: a pair of a list of recipe references, in the order they appear in the menu schedule,
+        and a mapping between references and recipes, with ``None`` for recipes that don't exist.
+    """
+
+    references = [
+        recipe_name
+        for day in menu['schedule']
+        for meal in day['meals']
+        for recipe_name in meal['recipes']
+    ]
+
+    recipes = {}
+
+    for recipe_name in references:
+        if recipe_name not in recipes:
+            recipes[recipe_name] = Recipe.find(db, name=recipe_name, did=recipe_name)
+
+    return references, recipes
 
 
 @cli.command(name='menu', help='Display various aspects of a menu.')
@@ -90,36 +109,49 @@ def cmd_menu(ctx, menu_name, menu_id, action, scale):
 
     if action == 'show':
         menu['.pre-formatted'] = {
-            'tags': [u'**{}**'.format(tag) for tag in menu['tags']]
+            'tags': [u'**%s**' % tag for tag in menu['tags'] or ()]
         }
 
-        text = jinja2.Template(MENU_TEMPLATE).render(DB=db, MENU=menu, Recipe=Recipe)
+        _, recipes = menu_recipes(db, menu)
 
-        formatted = mdv.main(text, theme='785.6556')
+        text = render_template(MENU_TEMPLATE, MENU=menu, RECIPES=recipes)
 
-        click.echo(formatted)
+        click.echo(render_markdown(text))
 
     elif action == 'shopping-list':
-        shopping_list = collections.defaultdict(list)
+        references, recipes = menu_recipes(db, menu)
 
-        for day in menu['schedule']:
-            for meal in day['meals']:
-                for recipe_name in meal['recipes']:
-                    recipe = Recipe.find(db, name=recipe_name, did=recipe_name)
+        # Scale each recipe just once, and remember its ingredients, no matter how many meals
+        # it appears in. Recipes are tracked by their IDs, one recipe may be referenced by
+        # different names.
+        ingredients = {}
 
-                    if not recipe:
-                        logger.warn("Cannot find recipe '{}'".format(recipe_name))
-                        continue
+        for recipe_name in references:
+            recipe = recipes[recipe_name]
+
+            if not recipe:
+                logger.warn("Cannot find recipe '{}'".format(recipe_name))
+                continue
+
+            if recipe.document_id in ingredients:
+                continue
+
+            recipe.scale(menu['guests'])
+
+            ingredients[recipe.document_id] = [
+                (ingredient['name'], ingredient.get('amount', None)) for ingredient in recipe['ingredients']
+            ]
+
+        shopping_list = collections.defaultdict(list)
 
-                    recipe.scale(menu['guests'])
+        for recipe_name in references:
+            recipe = recipes[recipe_name]
 
-                    for ingredient in recipe['ingredients']:
-                        if 'amount' in ingredient:
-                            shopping_list[ingredient['name']].append(ingredient['amount'])
+            if not recipe:
+                continue
 
-                        else:
-                            shopping_list[ingredient['name']].append(None)
+            for name, amount in ingredients[recipe.document_id]:
+                shopping_list[name].append(amount)
 
-        text = jinja2.Template(SHOPPING_LIST_TEMPLATE).render(MENU=menu, SHOPPING_LIST=shopping_list)
-        formatted = mdv.main(text, theme='785.6556')
-        click.echo(formatted)
+        text = render_template(SHOPPING_LIST_TEMPLATE, MENU=menu, SHOPPING_LIST=shopping_list)
+        click.echo(render_markdown(text))
@@ -1,15 +1,11 @@
 import click
-import tabulate
 
 from . import cli
-from ..db import Menu
 
 
-def menu_list_view(db, menu_ids, *filters):
-    for menu_id in menu_ids:
-        menu = Menu.get_document(db, menu_id)
-
-        if filters and not any(fn(menu) for fn in filters):
+def menu_list_view(db, tag=None):
+    for menu_id, menu in db.iter_menus():
+        if tag is not None and tag not in (menu['tags'] or ()):
             continue
 
         yield menu_id, menu
@@ -19,6 +15,8 @@ def menu_list_view(db, menu_ids, *filters):
 @click.option('--tag', help='List only menus with this tag')
 @click.pass_context
 def cmd_menus(ctx, tag=None):
+    import tabulate
+
     db = ctx.obj.open_database()
 
     headers = [
@@ -27,24 +25,17 @@ def cmd_menus(ctx, tag=None):
 
     table = []
 
-    filters = []
-    count = 0
-
-    if tag is not None:
-        filters.append(lambda menu: tag in menu['tags'])
-
-    for menu_id, menu in menu_list_view(db, db.index['menus'], *filters):
-        count += 1
+    for menu_id, menu in menu_list_view(db, tag=tag):
         table.append([
             u'',
             menu['title'],
             '',
             '',
-            u'\n'.join([u'- {}'.format(t) for t in menu['tags']]),
+            u'\n'.join(u'- %s' % t for t in menu['tags'] or ()),
             click.style(menu_id, fg='blue')
         ])
 
     click.echo(tabulate.tabulate(table, headers, tablefmt="simple"))
 
     click.secho('')
-    click.secho('{} menus'.format(count), fg='green')
+    click.secho('{} menus'.format(len(table)), fg='green')
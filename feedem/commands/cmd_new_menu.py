@@ -45,4 +45,4 @@ schedule:
           - bar
 """
 
-    cmd_new_document(ctx, 'menus', template, Menu)
+    cmd_new_document(ctx, template, Menu)
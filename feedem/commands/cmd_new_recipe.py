@@ -63,4 +63,4 @@ comments:
 #  - foo
 """
 
-    cmd_new_document(ctx, 'recipes', template, Recipe)
+    cmd_new_document(ctx, template, Recipe)
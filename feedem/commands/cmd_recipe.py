@@ -1,9 +1,7 @@
 import click
-import jinja2
-import mdv
 
 from ..db import Recipe
-from . import cli
+from . import cli, render_markdown, render_template
 
 
 RECIPE_TEMPLATE = u"""
@@ -39,8 +37,6 @@ RECIPE_TEMPLATE = u"""
 {% endfor %}
 """
 
-mdv.term_columns = click.get_terminal_size()[0]
-
 
 @cli.command(name='recipe', help='Display various aspects of a recipe.')
 @click.argument('recipe_name', required=False)
@@ -84,11 +80,9 @@ def cmd_recipe(ctx, recipe_name, recipe_id, action, scale):
 
     if action == 'show':
         recipe['.pre-formatted'] = {
-            'tags': [u'**{}**'.format(tag) for tag in recipe['tags']]
+            'tags': [u'**%s**' % tag for tag in recipe['tags'] or ()]
         }
 
-        text = jinja2.Template(RECIPE_TEMPLATE).render(RECIPE=recipe, SCALE=scales)
-
-        formatted = mdv.main(text, theme='785.6556')
+        text = render_template(RECIPE_TEMPLATE, RECIPE=recipe, SCALE=scales)
 
-        click.echo(formatted)
+        click.echo(render_markdown(text))
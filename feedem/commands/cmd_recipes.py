@@ -1,15 +1,11 @@
 import click
-import tabulate
 
 from . import cli
-from ..db import Recipe
 
 
-def recipe_list_view(db, recipe_ids, *filters):
-    for recipe_id in recipe_ids:
-        recipe = Recipe.get_document(db, recipe_id)
-
-        if filters and not any(fn(recipe) for fn in filters):
+def recipe_list_view(db, tag=None):
+    for recipe_id, recipe in db.iter_recipes():
+        if tag is not None and tag not in (recipe['tags'] or ()):
             continue
 
         yield recipe_id, recipe
@@ -19,6 +15,8 @@ def recipe_list_view(db, recipe_ids, *filters):
 @click.option('--tag', help='List only recipes with this tag')
 @click.pass_context
 def cmd_recipes(ctx, tag=None):
+    import tabulate
+
     db = ctx.obj.open_database()
 
     headers = [
@@ -27,26 +25,18 @@ def cmd_recipes(ctx, tag=None):
 
     table = []
 
-    filters = []
-    count = 0
-
-    if tag is not None:
-        filters.append(lambda recipe: tag in tags)
-
-    for recipe_id, recipe in recipe_list_view(db, db.index['recipes'], *filters):
-        count += 1
-
-        tags = recipe['tags'] if recipe['tags'] is not None else []
+    for _, recipe in recipe_list_view(db, tag=tag):
+        tags = recipe['tags'] or []
 
         table.append([
             u'',
             recipe['title'],
             recipe['portions'],
-            sum([step.get('time', 0) for step in recipe.data['steps']]),
-            u'\n'.join([u'- {}'.format(t) for t in tags])
+            recipe.preparation_time,
+            u'\n'.join(u'- %s' % t for t in tags)
         ])
 
     click.echo(tabulate.tabulate(table, headers, tablefmt="simple"))
 
     click.secho('')
-    click.secho('{} recipes'.format(count), fg='green')
+    click.secho('{} recipes'.format(len(table)), fg='green')
@@ -1,64 +1,278 @@
+import contextlib
+import errno
+import hashlib
+import io
 import os
+import re
 import subprocess
 
-import click
 import jsonschema
 import unidecode
 
-from . import normalize_path, dump_yaml, YAML
+from . import normalize_path, dump_yaml, YAML_FAST
 from .log import Logging
-from . import Amount, UNITS
+from . import Amount, UNITS, raise_amount
+
+
+#: How much of a document to read when looking for its title.
+TITLE_SCAN_SIZE = 1024
+
+#: Matches ``title`` key with a plain, unquoted value, when it's the very first key of the document.
+#: It may be preceded only by empty lines, comments and the document start marker - directives like
+#: ``%YAML 1.1`` change how values are loaded.
+TITLE_PATTERN = re.compile(
+    r'(?:(?:[ \t]*(?:#[^\n]*)?|---[ \t]*)\n)*title:[ \t]+([^\s\'"&*!|>{\[%@`#,?:=<-][^\n]*?)[ \t]*$',
+    re.MULTILINE
+)
+
+#: Matches values YAML might not load as a plain string, e.g. numbers, booleans or special floats.
+#: Any value starting with a sign or a dot is suspicious.
+NON_STRING_PATTERN = re.compile(
+    r'^(?:[+.]|\d|~$|null$|true$|false$|yes$|no$|on$|off$)',
+    re.IGNORECASE
+)
+
+#: Matches parts of a value which would end it early, e.g. a comment, or which YAML would not accept.
+AMBIGUOUS_VALUE_PATTERN = re.compile(r'[ \t]#|:(?:[ \t]|$)')
+
+#: Matches the end of a line followed by another top-level key, possibly after empty lines and comments.
+#: Anything else might continue the value on the previous line.
+NEXT_KEY_PATTERN = re.compile(r'\n(?:[ \t]*\n|#[^\n]*\n)*[^\s#]')
+
+#: Hash used to tell whether a document file has changed. BLAKE2 is not available on Python 2.
+CONTENT_HASH = getattr(hashlib, 'blake2b', hashlib.sha1)
+
+
+def content_hash(text):
+    """
+    Compute hash of a document text.
+
+    :param str text: text of the document.
+    :rtype: bytes
+    """
+
+    return CONTENT_HASH(text.encode('utf-8')).digest()
 
 
 class Document(object):
+    # There may be many documents loaded when walking through a collection, keep them small.
+    __slots__ = ('_db', '_data', '_title', '_common_name', '_last_hash', 'document_id', 'dirty')
+
+    #: Name of the index collection documents of this class belong to, `None` when they're
+    #: not listed in the index.
+    COLLECTION = None
+
+    #: JSON schema documents of this class must match, `None` when there's nothing to check.
+    SCHEMA = None
+
+    # Validator of SCHEMA, see `_get_validator`.
+    _validator = None
+
     def __init__(self, db, document_id):
         self._db = db
         self._data = None
+        self._title = None
+        self._common_name = None
+
+        # hash of the document file content as we've seen it the last time, `None` when unknown
+        self._last_hash = None
 
         self.document_id = document_id
 
         self.dirty = False
 
     def _commit(self):
-        output = subprocess.check_output(['git', 'status', '--porcelain'], cwd=self._db._path)
-
-        if not output.strip():
-            return
+        self._db.commit([self.document_id])
 
-        subprocess.check_call(['git', 'add', '{}.yml'.format(self.document_id)], cwd=self._db._path)
-        subprocess.check_call(['git', 'commit', '-a', '-m', 'Transaction commit'], cwd=self._db._path)
+    def _read(self):
+        with io.open(self._db.document_path(self.document_id), mode='r', encoding='utf-8') as f:
+            return f.read()
 
     def _get_raw(self):
-        with click.open_file(self._db.document_path(self.document_id), mode='r', encoding='utf-8') as f:
-            return f.read()
+        text = self._read()
 
-    def _set_raw(self, text):
-        document_path = self._db.document_path(self.document_id)
+        self._last_hash = content_hash(text)
 
-        with click.open_file(document_path, mode='w', encoding='utf-8') as f:
+        return text
+
+    def _set_raw(self, text, data=None):
+        text_hash = content_hash(text)
+
+        # The file holds this very text already - there's nothing to write, nothing to commit,
+        # and the index entry cannot change either.
+        if text_hash == self._last_hash:
+            self.data = data
+            return
+
+        with io.open(self._db.document_path(self.document_id), mode='w', encoding='utf-8') as f:
             f.write(text)
-            f.flush()
+
+        self._last_hash = text_hash
 
         self._commit()
 
-        self.data = None
+        # when we don't know what the text holds, it must be parsed again
+        if data is None:
+            self._db._parsed.pop(self.document_id, None)
+
+        else:
+            self._remember_parsed(data)
+
+        self.data = data
+
+        self._update_index()
 
     raw = property(_get_raw, _set_raw)
 
+    def update(self, text, data):
+        """
+        Replace the document with a new text, whose parsed form is already known, sparing
+        the next access of the document data parsing the text again.
+
+        :param str text: new text of the document.
+        :param data: ``text``, parsed.
+        """
+
+        self._set_raw(text, data=data)
+
     def _get_data(self):
         if self._data is None:
-            self._data = YAML.load(self.raw)
+            document_path = self._db.document_path(self.document_id)
+
+            mtime = os.stat(document_path).st_mtime
+
+            cached = self._db._parsed.get(self.document_id)
+
+            if cached is not None and cached[0] == mtime:
+                self._data = cached[1]
+
+            else:
+                text = self._read()
+
+                self._last_hash = content_hash(text)
+                self._data = YAML_FAST.load(text)
+
+                self._db._parsed[self.document_id] = (mtime, self._data)
 
         return self._data
 
     def _set_data(self, value):
         self._data = value
 
+        self._forget_derived()
+
     data = property(_get_data, _set_data)
 
+    def _remember_parsed(self, data):
+        """
+        Remember the parsed form of the document file that has just been written, sparing
+        whoever needs the document data next of parsing what we already know.
+
+        :param data: parsed content of the document file.
+        """
+
+        mtime = os.stat(self._db.document_path(self.document_id)).st_mtime
+
+        self._db._parsed[self.document_id] = (mtime, data)
+
+    def _forget(self):
+        """
+        Drop everything known about the document, it will be read from its file again when needed.
+        """
+
+        self._data = None
+        self._last_hash = None
+        self.dirty = False
+
+        self._forget_derived()
+
+    def _forget_derived(self):
+        """
+        Drop values computed from the document data, they will be computed again when needed.
+        """
+
+        self._title = None
+        self._common_name = None
+
+    def _scan_title(self):
+        """
+        Find the title by scanning the beginning of the document, without parsing it.
+
+        :returns: the title, or ``None`` when it's not possible to tell it for sure without
+            parsing the document - e.g. when the title is not the first key, or it's quoted.
+        """
+
+        with io.open(self._db.document_path(self.document_id), mode='r', encoding='utf-8') as f:
+            head = f.read(TITLE_SCAN_SIZE)
+
+        match = TITLE_PATTERN.match(head)
+
+        if match is None:
+            return None
+
+        title = match.group(1)
+
+        if AMBIGUOUS_VALUE_PATTERN.search(title) or NON_STRING_PATTERN.match(title):
+            return None
+
+        # Title must not continue on following lines, and the next key must be within the scanned
+        # text - otherwise we cannot tell where the title ends.
+        if NEXT_KEY_PATTERN.match(head, match.end()) is None:
+            return None
+
+        return title
+
+    @property
+    def title(self):
+        """
+        Title of the document. Unless the document has been already loaded, it is found by scanning
+        just the beginning of the document, sparing us of parsing the whole document when the title
+        is the only thing we need. ``None`` when the document has no title.
+        """
+
+        if self._title is None:
+            if self._data is None:
+                self._title = self._scan_title()
+
+            if self._title is None:
+                self._title = self.data.get('title')
+
+        return self._title
+
     @property
     def common_name(self):
-        return unidecode.unidecode(self.data['title'])
+        if self._common_name is None and self.title is not None:
+            # schema may allow titles which aren't strings, e.g. a year
+            self._common_name = unidecode.unidecode(u'{}'.format(self.title))
+
+        return self._common_name
+
+    @property
+    def index_entry(self):
+        """
+        Information on the document kept by the index, to spare us of loading the document when
+        looking for it.
+        """
+
+        return {
+            'id': self.document_id,
+            'title': self.title,
+            'common_name': self.common_name
+        }
+
+    def _update_index(self):
+        if self.COLLECTION is None:
+            return
+
+        index = self._db.index
+
+        index.update_entry(self.COLLECTION, self.index_entry)
+
+        self._db.forget_names()
+
+        # inside a transaction, the index is saved just once, when the transaction ends
+        if self._db._pending is None:
+            index.save()
 
     def __getitem__(self, key):
         return self.data[key]
@@ -66,6 +280,8 @@ class Document(object):
     def __setitem__(self, key, value):
         self.data[key] = value
 
+        self._forget_derived()
+
     def __hasitem__(self, key):
         return key in self.data
 
@@ -82,18 +298,41 @@ class Document(object):
 
         dump_yaml(self._data, document_path, logger=self._db.logger)
 
-        self._commit()
+        text_hash = content_hash(self._read())
+
+        self._remember_parsed(self._data)
 
         self.dirty = False
 
+        # dumped data may very well end up being the same text the file held before
+        if text_hash == self._last_hash:
+            return
+
+        self._last_hash = text_hash
+
+        self._commit()
+
+        self._update_index()
+
     @classmethod
-    def validate(cls, data, schema):
-        try:
-            jsonschema.validate(data, schema)
+    def _get_validator(cls):
+        # Each class has its own schema, therefore its own validator - don't use the one
+        # which may have been inherited from a parent class.
+        if '_validator' not in cls.__dict__:
+            cls._validator = None if cls.SCHEMA is None else jsonschema.validators.validator_for(cls.SCHEMA)(cls.SCHEMA)
+
+        return cls._validator
+
+    @classmethod
+    def validate(cls, data):
+        validator = cls._get_validator()
+
+        if validator is None:
             return True
 
-        except jsonschema.exceptions.ValidationError as exc:
-            return exc
+        error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+
+        return True if error is None else error
 
     @classmethod
     def new(cls, db, document_id):
@@ -104,17 +343,21 @@ class Document(object):
 
     @classmethod
     def get_document(cls, db, document_id):
-        return cls(db, document_id)
+        key = (cls, document_id)
+
+        document = db._documents.get(key)
+
+        if document is None:
+            document = db._documents[key] = cls(db, document_id)
+
+        return document
 
     @classmethod
     def find(cls, db, collection, name=None, did=None):
         if name:
-            for document_id in db.index[collection]:
-                document = cls.get_document(db, document_id)
-                if document['title'] == name or document.common_name == name:
-                    return document
+            document_id = db.name_index(collection).get(name)
 
-            return None
+            return cls.get_document(db, document_id) if document_id is not None else None
 
         if did:
             return cls.get_document(db, did)
@@ -123,11 +366,80 @@ class Document(object):
 
 
 class Index(Document):
+    """
+    Index of all documents. For each collection, it lists :py:attr:`Document.index_entry`
+    of its documents, in the order the documents were added.
+    """
+
+    __slots__ = ()
+
     def __init__(self, db, **kwargs):
         super(Index, self).__init__(db, 'index', **kwargs)
 
+    def _get_data(self):
+        if self._data is not None:
+            return self._data
+
+        data = super(Index, self)._get_data()
+
+        # Older databases list just IDs of documents - find out what we need to know about them.
+        # The converted index is saved with the next change of the database.
+        for document_class in (Recipe, Menu):
+            entries = data[document_class.COLLECTION]
+
+            if not entries or isinstance(entries[0], dict):
+                continue
+
+            data[document_class.COLLECTION] = [
+                document_class.get_document(self._db, document_id).index_entry
+                for document_id in entries
+            ]
+
+            self.dirty = True
+
+        return data
+
+    data = property(_get_data, Document._set_data)
+
+    def update_entry(self, collection, entry):
+        """
+        Replace the entry of a document, or add it to the end of the collection when the document
+        is not listed yet.
+
+        :param str collection: name of the collection.
+        :param dict entry: new entry, see :py:attr:`Document.index_entry`.
+        """
+
+        entries = self[collection]
+
+        for i, known_entry in enumerate(entries):
+            if known_entry['id'] == entry['id']:
+                entries[i] = entry
+                break
+
+        else:
+            entries.append(entry)
+
+        self.dirty = True
+
+    def _forget_derived(self):
+        super(Index, self)._forget_derived()
+
+        # index has been replaced, names must be collected again
+        self._db.forget_names()
+
+    def save(self, force=False):
+        super(Index, self).save(force=force)
+
+        # collections may have changed, names must be collected again
+        self._db.forget_names()
+
 
 class Recipe(Document):
+    __slots__ = ('_preparation_time',)
+
+    COLLECTION = 'recipes'
+
     SCHEMA = {
         'type': 'object',
         'properties': {
@@ -137,62 +449,82 @@ class Recipe(Document):
         }
     }
 
+    def __init__(self, db, document_id):
+        super(Recipe, self).__init__(db, document_id)
+
+        self._preparation_time = None
+
+    def _forget_derived(self):
+        super(Recipe, self)._forget_derived()
+
+        self._preparation_time = None
+
     def scale(self, scales):
+        portions, adults = self['portions'], scales['adults']
+        pieces = UNITS['pcs']
+
         for ingredient in self['ingredients']:
             if 'amount' not in ingredient:
                 continue
 
-            if isinstance(ingredient['amount'], int):
-                amount = Amount(float(ingredient['amount']), UNITS['pcs'])
+            amount = ingredient['amount']
 
-            else:
-                splitted = ingredient['amount'].split(' ')
-
-                amount = Amount(float(splitted[0]), UNITS[splitted[-1]])
-
-                # scale amount
-                amount.amount = amount.amount / self['portions'] * scales['adults']
+            if isinstance(amount, int):
+                ingredient['amount'] = Amount(float(amount), pieces)
+                continue
 
-                # raise units
-                while amount.can_be_raised is True:
-                    amount = amount.raise_()
+            splitted = amount.split(' ')
 
-            ingredient['amount'] = amount
-
-    @classmethod
-    def validate(cls, data):
-        return super(Recipe, cls).validate(data, Recipe.SCHEMA)
+            # scale amount, and raise its unit
+            ingredient['amount'] = raise_amount(float(splitted[0]) / portions * adults, UNITS[splitted[-1]])
 
     @property
     def preparation_time(self):
-        return sum([step.get('time', 0) for step in self['steps']])
+        if self._preparation_time is None:
+            self._preparation_time = sum(step.get('time', 0) for step in self['steps'])
+
+        return self._preparation_time
 
     @classmethod
     def find(cls, db, name=None, did=None):
-        return super(Recipe, cls).find(db, 'recipes', name=name, did=did)
+        return super(Recipe, cls).find(db, cls.COLLECTION, name=name, did=did)
 
 
 class Menu(Document):
+    __slots__ = ()
+
+    COLLECTION = 'menus'
+
     SCHEMA = {
         'type': 'object'
     }
 
-    @classmethod
-    def validate(cls, data):
-        return super(Menu, cls).validate(data, Menu.SCHEMA)
-
     @classmethod
     def find(cls, db, name=None, did=None):
-        return super(Menu, cls).find(db, 'menus', name=name, did=did)
+        return super(Menu, cls).find(db, cls.COLLECTION, name=name, did=did)
 
 
 class DB(object):
     def __init__(self, path, logger=None):
         self.logger = logger or Logging.get_logger()
 
-        self._path = normalize_path(path)
+        # callers make sure the database exists, no need to check it once again
+        self._path = normalize_path(path, fine_if_missing=True)
         self._index = None
 
+        # Documents already loaded during this invocation, keyed by (document class, document ID).
+        self._documents = {}
+
+        # IDs of documents written during an open transaction, or `None` when there's no transaction.
+        self._pending = None
+
+        # Parsed documents, keyed by document ID, with modification times of their files at
+        # the moment they were parsed: (mtime, data).
+        self._parsed = {}
+
+        # Name indices, one per collection, see `name_index`.
+        self._name_indices = {}
+
     @property
     def index(self):
         if self._index is None:
@@ -204,30 +536,207 @@ class DB(object):
     def initialize(cls, path, logger=None):
         logger = logger or Logging.get_logger()
 
-        if os.path.exists(path):
-            logger.debug("directory '{}' exists already".format(path))
+        logger.debug("create directory '{}'".format(path))
 
-        else:
-            logger.debug("create directory '{}'".format(path))
+        try:
             os.mkdir(path)
 
-        subprocess.check_call(['git', 'init'], cwd=path)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+            logger.debug("directory '{}' exists already".format(path))
 
         db = DB(path)
 
+        db._git('init', '-q')
+
         index_data = {
-            'recipes': [],
-            'menus': []
+            Recipe.COLLECTION: [],
+            Menu.COLLECTION: []
         }
 
-        index = Index(db)
-        index.data = index_data
-        index.save(force=True)
-
-        subprocess.check_call(['git', 'add', 'index.yml'], cwd=path)
-        subprocess.check_call(['git', 'commit', '-a', '-m', 'Initial commit'], cwd=path)
+        with db.transaction(message='Initial commit'):
+            db.index.data = index_data
+            db.index.save(force=True)
 
         return db
 
+    def commit(self, document_ids, message='Transaction commit'):
+        """
+        Commit changes of documents into the database repository. When inside a transaction,
+        the documents are just remembered, to be committed when the transaction ends.
+
+        :param list document_ids: IDs of changed documents.
+        :param str message: commit message.
+        """
+
+        if self._pending is not None:
+            self._pending += document_ids
+            return
+
+        paths = ['{}.yml'.format(did) for did in document_ids]
+
+        # Limit the status to the documents we're interested in - git then doesn't have to scan
+        # the whole database for changes.
+        if not self._git('status', '--porcelain', '--', *paths).strip():
+            return
+
+        self._git('add', '--', *paths)
+        self._git('commit', '-q', '-a', '-m', message)
+
+    def _git(self, *args):
+        """
+        Run git command in the database repository.
+
+        :param args: git command and its arguments.
+        :returns: output of the command.
+        """
+
+        return subprocess.check_output(['git'] + list(args), cwd=self._path)
+
+    @contextlib.contextmanager
+    def transaction(self, message='Transaction commit'):
+        """
+        Collect all changes made inside the ``with`` block into a single commit, instead of
+        committing each document on its own.
+
+        .. code-block:: python
+
+           with db.transaction():
+               recipe.raw = text
+               menu.raw = another_text
+
+        The index is saved, if it needs to be, just once, when the block ends.
+
+        When the block raises an exception, or the changes cannot be committed, nothing is
+        committed, and files of documents written inside the block are restored - see
+        :py:meth:`_rollback`.
+
+        :param str message: commit message.
+        """
+
+        assert self._pending is None, 'Transactions cannot be nested'
+
+        document_ids = self._pending = []
+
+        try:
+            try:
+                yield self
+
+                # documents changed during the transaction may have left the index waiting for a save
+                if self._index is not None:
+                    self._index.save()
+
+            finally:
+                self._pending = None
+
+            if document_ids:
+                self.commit(document_ids, message=message)
+
+        except Exception:
+            self._rollback(document_ids)
+            raise
+
+    def _rollback(self, document_ids):
+        """
+        Restore files of documents to their last committed state, and remove those which have
+        not been committed yet. Everything known about these documents, and about the index, is
+        forgotten, to be read from files again.
+
+        :param list document_ids: IDs of documents to restore.
+        """
+
+        paths = sorted(set('{}.yml'.format(did) for did in document_ids))
+
+        if paths:
+            try:
+                committed = self._git('ls-tree', '--name-only', 'HEAD', '--', *paths).decode('utf-8').split()
+
+            except subprocess.CalledProcessError:
+                # there's no commit yet
+                committed = []
+
+            if committed:
+                self._git('checkout', '-q', 'HEAD', '--', *committed)
+
+            for path in paths:
+                if path in committed:
+                    continue
+
+                self._git('rm', '-q', '--cached', '--ignore-unmatch', '--', path)
+
+                full_path = os.path.join(self._path, path)
+
+                if os.path.exists(full_path):
+                    os.unlink(full_path)
+
+        for (_, document_id), document in self._documents.items():
+            if document_id in document_ids:
+                document._forget()
+
+        for document_id in document_ids:
+            self._parsed.pop(document_id, None)
+
+        # index could have been changed in memory only, without being saved
+        self._index = None
+        self._parsed.pop('index', None)
+
+        self.forget_names()
+
+    def _iter_documents(self, document_class):
+        for entry in self.index[document_class.COLLECTION]:
+            yield entry['id'], document_class.get_document(self, entry['id'])
+
+    def iter_recipes(self):
+        """
+        Iterate over all recipes, yielding pairs of ``(recipe ID, recipe)``.
+        """
+
+        return self._iter_documents(Recipe)
+
+    def iter_menus(self):
+        """
+        Iterate over all menus, yielding pairs of ``(menu ID, menu)``.
+        """
+
+        return self._iter_documents(Menu)
+
+    def name_index(self, collection):
+        """
+        Return a mapping between names of documents in a collection and their IDs. Titles, common
+        names and IDs are all accepted as names. The mapping is built once, on the first use, from
+        the index, without loading any document.
+
+        :param str collection: name of the collection.
+        :rtype: dict
+        """
+
+        names = self._name_indices.get(collection)
+
+        if names is None:
+            names = self._name_indices[collection] = {}
+
+            entries = self.index[collection]
+
+            # When more documents share a name, the one added first wins.
+            for entry in entries:
+                # documents without a title can be found by their IDs only
+                if entry['title']:
+                    names.setdefault(entry['title'], entry['id'])
+                    names.setdefault(entry['common_name'], entry['id'])
+
+            for entry in entries:
+                names.setdefault(entry['id'], entry['id'])
+
+        return names
+
+    def forget_names(self):
+        """
+        Drop all name indices, they will be built again when needed.
+        """
+
+        self._name_indices = {}
+
     def document_path(self, did):
         return os.path.join(self._path, '{}.yml'.format(did))
@@ -40,25 +40,23 @@ Example usage:
 import atexit
 import json
 import logging
+import sys
 import traceback
 
 import click
-import jinja2
 
 
 BLOB_HEADER = '---v---v---v---v---v---'
 BLOB_FOOTER = '---^---^---^---^---^---'
 
 
-_TRACEBACK_TEMPLATE = """
-{%- set label = '{}:'.format(label) %}
----v---v---v---v---v--- {{ label | center(10) }} ---v---v---v---v---v---
+_TRACEBACK_TEMPLATE = u"""
+---v---v---v---v---v--- {label} ---v---v---v---v---v---
 
-{{ exception.__class__.__module__ }}.{{ exception.__class__.__name__ }}: {{ exception.message }}
+{module}.{name}: {message}
 
-{{ traceback }}
----^---^---^---^---^---^----------^---^---^---^---^---^---
-"""
+{traceback}
+---^---^---^---^---^---^----------^---^---^---^---^---^---"""
 
 
 class BlobLogger(object):
@@ -277,6 +275,8 @@ class LoggingFormatter(logging.Formatter):
     :param bool log_tracebacks: if set, add tracebacks to the message. By default,
         we don't need tracebacks on the terminal, unless its loglevel is verbose enough,
         but we want them in the debugging file.
+    :param bool colors: if set, colorize messages according to their loglevel. By default,
+        colors are used only when standard error output is connected to a terminal.
     """
 
     #: Tags used to express loglevel.
@@ -290,25 +290,34 @@ class LoggingFormatter(logging.Formatter):
 
     #: Colors assigned to loglevels
     _level_color = {
+        logging.DEBUG: {},
         logging.INFO: dict(fg='green'),
         logging.WARNING: dict(fg='yellow'),
         logging.ERROR: dict(fg='red'),
         logging.CRITICAL: dict(fg='red')
     }
 
-    def __init__(self, log_tracebacks=False):
+    def __init__(self, log_tracebacks=False, colors=None):
         super(LoggingFormatter, self).__init__()
 
+        if colors is None:
+            colors = sys.stderr.isatty()
+
         self.log_tracebacks = log_tracebacks
+        self.colors = colors
 
     @staticmethod
     def _format_exception_chain(exc_info):
-        tmpl = jinja2.Template(_TRACEBACK_TEMPLATE)
-
         output = ['']
 
         def _add_block(label, exc, trace):
-            output.append(tmpl.render(label=label, exception=exc, traceback=''.join(traceback.format_tb(trace))))
+            output.append(_TRACEBACK_TEMPLATE.format(
+                label='{}:'.format(label).center(10),
+                module=exc.__class__.__module__,
+                name=exc.__class__.__name__,
+                message=exc,
+                traceback=''.join(traceback.format_tb(trace))
+            ))
 
         # don't unpack traceback - it might lead to a circular reference, leaving this frame
         # uncollectable
@@ -345,7 +354,7 @@ class LoggingFormatter(logging.Formatter):
             values['exc_text'] = LoggingFormatter._format_exception_chain(record.exc_info)
 
         # List all context properties of record
-        ctx_properties = [prop for prop in dir(record) if prop.startswith('ctx_')]
+        ctx_properties = [prop for prop in record.__dict__ if prop.startswith('ctx_')]
 
         if ctx_properties:
             # Sorting them in reverse order of priorities - we're goign to insert
@@ -359,7 +368,12 @@ class LoggingFormatter(logging.Formatter):
                 fmt.insert(2, '[{%s}]' % name)
                 values[name] = value
 
-        return click.style(' '.join(fmt).format(**values), **self._level_color[record.levelno])
+        message = ' '.join(fmt).format(**values)
+
+        if not self.colors:
+            return message
+
+        return click.style(message, **self._level_color[record.levelno])
 
 
 class Logging(object):
@@ -460,7 +474,7 @@ class Logging(object):
             handler = logging.FileHandler(output_file, 'w')
             handler.setLevel(logging.DEBUG)
 
-            formatter = LoggingFormatter(log_tracebacks=True)
+            formatter = LoggingFormatter(log_tracebacks=True, colors=False)
             formatter.log_tracebacks = True
             handler.setFormatter(formatter)
 
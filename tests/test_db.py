@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+
+import pytest
+
+from feedem import YAML_FAST
+from feedem.db import DB, Document, Index, Menu, Recipe
+from feedem.log import Logging
+
+
+@pytest.fixture
+def db(tmpdir, monkeypatch):
+    for variable in ('GIT_AUTHOR_NAME', 'GIT_COMMITTER_NAME'):
+        monkeypatch.setenv(variable, 'feedem')
+
+    for variable in ('GIT_AUTHOR_EMAIL', 'GIT_COMMITTER_EMAIL'):
+        monkeypatch.setenv(variable, 'feedem@example.com')
+
+    Logging.create_logger()
+
+    return DB.initialize(str(tmpdir.join('db')))
+
+
+def _commits(db):
+    return db._git('log', '--format=%s').decode('utf-8').splitlines()
+
+
+def _committed_files(db):
+    return db._git('show', '--format=', '--name-only', 'HEAD').decode('utf-8').split()
+
+
+def _status(db):
+    return db._git('status', '--porcelain').decode('utf-8')
+
+
+def _write_document(tmpdir, text, document_class=Recipe):
+    db = DB(str(tmpdir))
+
+    with io.open(db.document_path('d1'), mode='w', encoding='utf-8') as f:
+        f.write(text)
+
+    return document_class(db, 'd1')
+
+
+@pytest.mark.parametrize('text, title', [
+    (u'title: Foo\n', None),  # no key after the title, it may continue beyond scanned text
+    (u'title: Foo\nportions: 4\n', u'Foo'),
+    (u'title: Guláš s knedlíkem\nportions: 4\n', u'Guláš s knedlíkem'),
+    (u'---\n\n# Name of the recipe\ntitle: Foo   \n\n\n# Portions\nportions: 4\n', u'Foo'),
+    (u'%YAML 1.2\n---\ntitle: Foo\nportions: 4\n', None),
+    (u'%YAML 1.1\n---\ntitle: y\nportions: 4\n', None),
+    (u'title: Foo bar: baz\nportions: 4\n', None),
+    (u'title: Foo # comment\nportions: 4\n', None),
+    (u'title: Foo\t# comment\nportions: 4\n', None),
+    (u'title: Foo:\nportions: 4\n', None),
+    (u'title: "Foo"\nportions: 4\n', None),
+    (u"title: 'Foo'\nportions: 4\n", None),
+    (u'title: &anchor Foo\nportions: 4\n', None),
+    (u'title: >\n  Foo\nportions: 4\n', None),
+    (u'title: Foo\n  bar\nportions: 4\n', None),
+    (u'title: Foo\n\n  bar\nportions: 4\n', None),
+    (u'title: Foo\n  # comment\nportions: 4\n', None),
+    (u'title: 12\nportions: 4\n', None),
+    (u'title: .5\nportions: 4\n', None),
+    (u'title: +.5\nportions: 4\n', None),
+    (u'title: .Foo\nportions: 4\n', None),
+    (u'title: .inf\nportions: 4\n', None),
+    (u'title: +.Inf\nportions: 4\n', None),
+    (u'title: .NaN\nportions: 4\n', None),
+    (u'title: yes\nportions: 4\n', None),
+    (u'title: null\nportions: 4\n', None),
+    (u'title: ~\nportions: 4\n', None),
+    (u'portions: 4\ntitle: Foo\nsteps: []\n', None),  # not the first key
+    (u'notes: "abc\ntitle: Foo\n"\ntitle: Bar\nsteps: []\n', None),
+    (u'notes: [a,\ntitle: Foo]\ntitle: Bar\n', None),
+])
+def test_scan_title(tmpdir, text, title):
+    recipe = _write_document(tmpdir, text)
+
+    assert recipe._scan_title() == title
+
+
+@pytest.mark.parametrize('text', [
+    u'title: Foo\nportions: 4\n',
+    u'title: Foo\n\n  bar\nportions: 4\n',
+    u'title: .inf\nportions: 4\n',
+    u'title: +.5\nportions: 4\n',
+    u'%YAML 1.1\n---\ntitle: y\nportions: 4\n',
+    u'title: Foo # comment\nportions: 4\n',
+    u'portions: 4\ntitle: Foo\n',
+])
+def test_title_matches_parser(tmpdir, text):
+    recipe = _write_document(tmpdir, text)
+
+    assert recipe.title == YAML_FAST.load(text)['title']
+
+
+def test_scan_title_beyond_scanned_text(tmpdir):
+    recipe = _write_document(tmpdir, u'# {}\ntitle: Foo\nportions: 4\n'.format(u'x' * 2048))
+
+    assert recipe._scan_title() is None
+    assert recipe.title == u'Foo'
+
+
+@pytest.mark.parametrize('text, title, common_name', [
+    (u'title: Guláš\nguests: {}\n', u'Guláš', u'Gulas'),
+    (u'title: 2018\nguests: {}\n', 2018, u'2018'),
+    (u'title:\nguests: {}\n', None, None),
+    (u'guests: {}\n', None, None),
+])
+def test_index_entry(tmpdir, text, title, common_name):
+    menu = _write_document(tmpdir, text, document_class=Menu)
+
+    assert menu.index_entry == {
+        'id': 'd1',
+        'title': title,
+        'common_name': common_name
+    }
+
+
+def test_transaction_commit(db):
+    with db.transaction(message='Add recipes'):
+        Recipe.new(db, 'r1').raw = u'title: Foo\nportions: 4\n'
+        Recipe.new(db, 'r2').raw = u'title: Bar\nportions: 2\n'
+
+    assert _commits(db) == ['Add recipes', 'Initial commit']
+    assert sorted(_committed_files(db)) == ['index.yml', 'r1.yml', 'r2.yml']
+    assert _status(db) == ''
+
+    assert Recipe.find(db, name=u'Bar').document_id == 'r2'
+
+
+def test_transaction_rollback(db):
+    Recipe.new(db, 'r1').raw = u'title: Foo\nportions: 4\n'
+
+    commits = _commits(db)
+    recipe = Recipe.get_document(db, 'r1')
+
+    with pytest.raises(ValueError):
+        with db.transaction():
+            recipe.raw = u'title: Bar\nportions: 2\n'
+            Recipe.new(db, 'r2').raw = u'title: Baz\nportions: 1\n'
+
+            raise ValueError()
+
+    assert db._pending is None
+    assert _commits(db) == commits
+    assert _status(db) == ''
+    assert not os.path.exists(db.document_path('r2'))
+
+    assert recipe.title == u'Foo'
+    assert Recipe.find(db, name=u'Foo') is recipe
+    assert Recipe.find(db, name=u'Bar') is None
+    assert Recipe.find(db, name=u'Baz') is None
+
+
+def test_transaction_commit_failure(db, monkeypatch):
+    commits = _commits(db)
+    git = db._git
+
+    def _git(*args):
+        if args[0] == 'commit':
+            raise RuntimeError('commit failed')
+
+        return git(*args)
+
+    monkeypatch.setattr(db, '_git', _git)
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            Recipe.new(db, 'r1').raw = u'title: Foo\nportions: 4\n'
+
+    monkeypatch.undo()
+
+    assert db._pending is None
+    assert _commits(db) == commits
+    assert _status(db) == ''
+    assert db.index['recipes'] == []
+
+
+def test_transaction_nesting(db):
+    with pytest.raises(AssertionError):
+        with db.transaction():
+            with db.transaction():
+                pass
+
+    assert db._pending is None
+
+    with db.transaction():
+        Recipe.new(db, 'r1').raw = u'title: Foo\nportions: 4\n'
+
+    assert sorted(_committed_files(db)) == ['index.yml', 'r1.yml']
+
+
+def test_validate():
+    assert Document.validate({'title': 2018}) is True
+    assert Index.validate({'recipes': []}) is True
+    assert Menu.validate({'title': 2018}) is True
+    assert Recipe.validate({'title': u'Foo'}) is True
+    assert Recipe.validate({'title': 2018}).path[0] == 'title'